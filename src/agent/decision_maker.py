@@ -5,6 +5,76 @@ import json
 import logging
 from datetime import datetime
 
+# Static parts of the system prompt; only the assets line varies per call
+_SYSTEM_PROMPT_INTRO = (
+    "You are a rigorous QUANTITATIVE TRADER and interdisciplinary MATHEMATICIAN-ENGINEER optimizing risk-adjusted returns for perpetual futures under real execution, margin, and funding constraints.\n"
+    "You will receive market + account context for SEVERAL assets, including:\n"
+)
+
+_SYSTEM_PROMPT_BODY = (
+    "- per-asset intraday (5m) and higher-timeframe (4h) metrics\n"
+    "- Active Trades with Exit Plans\n"
+    "- Recent Trading History\n\n"
+    "Always use the 'current time' provided in the user message to evaluate any time-based conditions, such as cooldown expirations or timed exit plans.\n\n"
+    "Your goal: make decisive, first-principles decisions per asset that minimize churn while capturing edge.\n\n"
+    "Core policy (low-churn, position-aware)\n"
+    "1) Respect prior plans: If an active trade has an exit_plan with explicit invalidation (e.g., “close if 4h close above EMA50”), DO NOT close or flip early unless that invalidation (or a stronger one) has occurred.\n"
+    "2) Hysteresis: Require stronger evidence to CHANGE a decision than to keep it. Only flip direction if BOTH:\n"
+    "   a) Higher-timeframe structure supports the new direction (e.g., 4h EMA20 vs EMA50 and/or MACD regime), AND\n"
+    "   b) Intraday structure confirms with a decisive break beyond ~0.5×ATR (recent) and momentum alignment (MACD or RSI slope).\n"
+    "   Otherwise, prefer HOLD or adjust TP/SL.\n"
+    "3) Cooldown: After opening, adding, reducing, or flipping, impose a self-cooldown of at least 3 bars of the decision timeframe (e.g., 3×5m = 15m) before another direction change, unless a hard invalidation occurs. Encode this in exit_plan (e.g., “cooldown_bars:3 until 2025-10-19T15:55Z”). You must honor your own cooldowns on future cycles.\n"
+    "4) Funding is a tilt, not a trigger: Do NOT open/close/flip solely due to funding unless expected funding over your intended holding horizon meaningfully exceeds expected edge (e.g., > ~0.25×ATR). Consider that funding accrues discretely and slowly relative to 5m bars.\n"
+    "5) Overbought/oversold ≠ reversal by itself: Treat RSI extremes as risk-of-pullback. You need structure + momentum confirmation to bet against trend. Prefer tightening stops or taking partial profits over instant flips.\n"
+    "6) Prefer adjustments over exits: If the thesis weakens but is not invalidated, first consider: tighten stop (e.g., to a recent swing or ATR multiple), trail TP, or reduce size. Flip only on hard invalidation + fresh confluence.\n\n"
+    "Decision discipline (per asset)\n"
+    "- Choose one: buy / sell / hold.\n"
+    "- You control allocation_usd.\n"
+    "- TP/SL sanity:\n"
+    "  • BUY: tp_price > current_price, sl_price < current_price\n"
+    "  • SELL: tp_price < current_price, sl_price > current_price\n"
+    "  If sensible TP/SL cannot be set, use null and explain the logic.\n"
+    "- exit_plan must include at least ONE explicit invalidation trigger and may include cooldown guidance you will follow later.\n\n"
+    "Leverage policy (perpetual futures)\n"
+    "- YOU CAN USE LEVERAGE, ATLEAST 2X LEVERAGE TO GET BETTER RETURN, KEEP IT WITHIN 5X IN TOTAL\n"
+    "- In high volatility (elevated ATR) or during funding spikes, reduce or avoid leverage.\n"
+    "- Treat allocation_usd as notional exposure; keep it consistent with safe leverage and available margin.\n\n"
+    "Tool usage\n"
+    "- Call fetch_taapi_indicator ONLY if one specific reading would materially change your decision. Keep parameters minimal (indicator, symbol like \"BTC/USDT\", interval \"5m\"/\"4h\", optional period).\n\n"
+    "- Tool usage is recommended, in case you don't feel confident enough with provided indicators or if you want more information."
+    "Reasoning recipe (first principles)\n"
+    "- Structure (trend, EMAs slope/cross, HH/HL vs LH/LL), Momentum (MACD regime, RSI slope), Liquidity/volatility (ATR, volume), Positioning tilt (funding, OI).\n"
+    "- Favor alignment across 4h and 5m. Counter-trend scalps require stronger intraday confirmation and tighter risk.\n\n"
+    "Output contract\n"
+    "- Output STRICT JSON array (no Markdown, no extra text), one object per asset in the SAME ORDER as the provided assets list.\n"
+    "- Exact keys for each object: {asset, action, allocation_usd, tp_price, sl_price, exit_plan, rationale}\n"
+)
+
+_TAAPI_TOOLS = [{
+    "type": "function",
+    "function": {
+        "name": "fetch_taapi_indicator",
+        "description": ("Fetch any TAAPI indicator. Available: ema, sma, rsi, macd, bbands, stochastic, stochrsi, "
+            "adx, atr, cci, dmi, ichimoku, supertrend, vwap, obv, mfi, willr, roc, mom, sar (parabolic), "
+            "fibonacci, pivotpoints, keltner, donchian, awesome, gator, alligator, and 200+ more. "
+            "See https://taapi.io/indicators/ for full list and parameters."),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "indicator": {"type": "string"},
+                "symbol": {"type": "string"},
+                "interval": {"type": "string"},
+                "period": {"type": "integer"},
+                "backtrack": {"type": "integer"},
+                "other_params": {"type": "object", "additionalProperties": {"type": ["string", "number", "boolean"]}},
+            },
+            "required": ["indicator", "symbol", "interval"],
+            "additionalProperties": False,
+        },
+    },
+}]
+
+
 class TradingAgent:
     def __init__(self):
         self.model = CONFIG["llm_model"]
@@ -13,6 +83,17 @@ class TradingAgent:
         self.base_url = f"{base}/chat/completions"
         self.referer = CONFIG.get("openrouter_referer")
         self.app_title = CONFIG.get("openrouter_app_title")
+        # Request headers are invariant across calls; build them once
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+        if self.referer:
+            self.headers["HTTP-Referer"] = self.referer
+        if self.app_title:
+            self.headers["X-Title"] = self.app_title
+        # Keep-alive session: each decision makes several OpenRouter calls (tool loop, sanitizer)
+        self.session = requests.Session()
         self.taapi = TAAPIClient()
         # Fast/cheap sanitizer model to normalize outputs on parse failures
         self.sanitize_model = CONFIG.get("sanitize_model") or "openai/gpt-5"
@@ -23,45 +104,9 @@ class TradingAgent:
 
     def _decide(self, context, assets):
         system_prompt = (
-            "You are a rigorous QUANTITATIVE TRADER and interdisciplinary MATHEMATICIAN-ENGINEER optimizing risk-adjusted returns for perpetual futures under real execution, margin, and funding constraints.\n"
-            "You will receive market + account context for SEVERAL assets, including:\n"
-            f"- assets = {json.dumps(assets)}\n"
-            "- per-asset intraday (5m) and higher-timeframe (4h) metrics\n"
-            "- Active Trades with Exit Plans\n"
-            "- Recent Trading History\n\n"
-            "Always use the 'current time' provided in the user message to evaluate any time-based conditions, such as cooldown expirations or timed exit plans.\n\n"
-            "Your goal: make decisive, first-principles decisions per asset that minimize churn while capturing edge.\n\n"
-            "Core policy (low-churn, position-aware)\n"
-            "1) Respect prior plans: If an active trade has an exit_plan with explicit invalidation (e.g., “close if 4h close above EMA50”), DO NOT close or flip early unless that invalidation (or a stronger one) has occurred.\n"
-            "2) Hysteresis: Require stronger evidence to CHANGE a decision than to keep it. Only flip direction if BOTH:\n"
-            "   a) Higher-timeframe structure supports the new direction (e.g., 4h EMA20 vs EMA50 and/or MACD regime), AND\n"
-            "   b) Intraday structure confirms with a decisive break beyond ~0.5×ATR (recent) and momentum alignment (MACD or RSI slope).\n"
-            "   Otherwise, prefer HOLD or adjust TP/SL.\n"
-            "3) Cooldown: After opening, adding, reducing, or flipping, impose a self-cooldown of at least 3 bars of the decision timeframe (e.g., 3×5m = 15m) before another direction change, unless a hard invalidation occurs. Encode this in exit_plan (e.g., “cooldown_bars:3 until 2025-10-19T15:55Z”). You must honor your own cooldowns on future cycles.\n"
-            "4) Funding is a tilt, not a trigger: Do NOT open/close/flip solely due to funding unless expected funding over your intended holding horizon meaningfully exceeds expected edge (e.g., > ~0.25×ATR). Consider that funding accrues discretely and slowly relative to 5m bars.\n"
-            "5) Overbought/oversold ≠ reversal by itself: Treat RSI extremes as risk-of-pullback. You need structure + momentum confirmation to bet against trend. Prefer tightening stops or taking partial profits over instant flips.\n"
-            "6) Prefer adjustments over exits: If the thesis weakens but is not invalidated, first consider: tighten stop (e.g., to a recent swing or ATR multiple), trail TP, or reduce size. Flip only on hard invalidation + fresh confluence.\n\n"
-            "Decision discipline (per asset)\n"
-            "- Choose one: buy / sell / hold.\n"
-            "- You control allocation_usd.\n"
-            "- TP/SL sanity:\n"
-            "  • BUY: tp_price > current_price, sl_price < current_price\n"
-            "  • SELL: tp_price < current_price, sl_price > current_price\n"
-            "  If sensible TP/SL cannot be set, use null and explain the logic.\n"
-            "- exit_plan must include at least ONE explicit invalidation trigger and may include cooldown guidance you will follow later.\n\n"
-            "Leverage policy (perpetual futures)\n"
-            "- YOU CAN USE LEVERAGE, ATLEAST 2X LEVERAGE TO GET BETTER RETURN, KEEP IT WITHIN 5X IN TOTAL\n"
-            "- In high volatility (elevated ATR) or during funding spikes, reduce or avoid leverage.\n"
-            "- Treat allocation_usd as notional exposure; keep it consistent with safe leverage and available margin.\n\n"
-            "Tool usage\n"
-            "- Call fetch_taapi_indicator ONLY if one specific reading would materially change your decision. Keep parameters minimal (indicator, symbol like \"BTC/USDT\", interval \"5m\"/\"4h\", optional period).\n\n"
-            "- Tool usage is recommended, in case you don't feel confident enough with provided indicators or if you want more information."
-            "Reasoning recipe (first principles)\n"
-            "- Structure (trend, EMAs slope/cross, HH/HL vs LH/LL), Momentum (MACD regime, RSI slope), Liquidity/volatility (ATR, volume), Positioning tilt (funding, OI).\n"
-            "- Favor alignment across 4h and 5m. Counter-trend scalps require stronger intraday confirmation and tighter risk.\n\n"
-            "Output contract\n"
-            "- Output STRICT JSON array (no Markdown, no extra text), one object per asset in the SAME ORDER as the provided assets list.\n"
-            "- Exact keys for each object: {asset, action, allocation_usd, tp_price, sl_price, exit_plan, rationale}\n"
+            _SYSTEM_PROMPT_INTRO
+            + f"- assets = {json.dumps(assets)}\n"
+            + _SYSTEM_PROMPT_BODY
         )
         user_prompt = context
         messages = [
@@ -69,51 +114,22 @@ class TradingAgent:
             {"role": "user", "content": user_prompt},
         ]
 
-        tools = [{
-            "type": "function",
-            "function": {
-                "name": "fetch_taapi_indicator",
-                "description": ("Fetch any TAAPI indicator. Available: ema, sma, rsi, macd, bbands, stochastic, stochrsi, "
-                    "adx, atr, cci, dmi, ichimoku, supertrend, vwap, obv, mfi, willr, roc, mom, sar (parabolic), "
-                    "fibonacci, pivotpoints, keltner, donchian, awesome, gator, alligator, and 200+ more. "
-                    "See https://taapi.io/indicators/ for full list and parameters."),
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "indicator": {"type": "string"},
-                        "symbol": {"type": "string"},
-                        "interval": {"type": "string"},
-                        "period": {"type": "integer"},
-                        "backtrack": {"type": "integer"},
-                        "other_params": {"type": "object", "additionalProperties": {"type": ["string", "number", "boolean"]}},
-                    },
-                    "required": ["indicator", "symbol", "interval"],
-                    "additionalProperties": False,
-                },
-            },
-        }]
+        tools = _TAAPI_TOOLS
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
-        if self.referer:
-            headers["HTTP-Referer"] = self.referer
-        if self.app_title:
-            headers["X-Title"] = self.app_title
+        headers = self.headers
 
         def _post(payload):
             # Log the full request payload for debugging
-            logging.info(f"Sending request to OpenRouter (model: {payload.get('model')})")
+            logging.info("Sending request to OpenRouter (model: %s)", payload.get('model'))
             with open("llm_requests.log", "a") as f:
                 f.write(f"\n\n=== {datetime.now()} ===\n")
                 f.write(f"Model: {payload.get('model')}\n")
                 f.write(f"Headers: {json.dumps({k: v for k, v in headers.items() if k != 'Authorization'})}\n")
                 f.write(f"Payload:\n{json.dumps(payload, indent=2)}\n")
-            resp = requests.post(self.base_url, headers=headers, json=payload, timeout=60)
-            logging.info(f"Received response from OpenRouter (status: {resp.status_code})")
+            resp = self.session.post(self.base_url, headers=headers, json=payload, timeout=60)
+            logging.info("Received response from OpenRouter (status: %s)", resp.status_code)
             if resp.status_code != 200:
-                logging.error(f"OpenRouter error: {resp.status_code} - {resp.text}")
+                logging.error("OpenRouter error: %s - %s", resp.status_code, resp.text)
                 with open("llm_requests.log", "a") as f:
                     f.write(f"ERROR Response: {resp.status_code} - {resp.text}\n")
             resp.raise_for_status()
@@ -197,7 +213,7 @@ class TradingAgent:
                     pass
                 return []
             except Exception as se:
-                logging.error(f"Sanitize failed: {se}")
+                logging.error("Sanitize failed: %s", se)
                 return []
 
         allow_tools = True
@@ -232,6 +248,8 @@ class TradingAgent:
                 "additionalProperties": False,
             }
 
+        decision_schema = _build_schema()
+
         for _ in range(6):
             data = {"model": self.model, "messages": messages}
             if allow_structured:
@@ -240,7 +258,7 @@ class TradingAgent:
                     "json_schema": {
                         "name": "trade_decisions",
                         "strict": True,
-                        "schema": _build_schema(),
+                        "schema": decision_schema,
                     },
                 }
             if allow_tools:
@@ -278,32 +296,28 @@ class TradingAgent:
                     if tc.get("type") == "function" and tc.get("function", {}).get("name") == "fetch_taapi_indicator":
                         args = json.loads(tc["function"].get("arguments") or "{}")
                         try:
-                            params = {
-                                "secret": self.taapi.api_key,
-                                "exchange": "binance",
-                                "symbol": args["symbol"],
-                                "interval": args["interval"],
-                            }
+                            params = {}
                             if args.get("period") is not None:
                                 params["period"] = args["period"]
                             if args.get("backtrack") is not None:
                                 params["backtrack"] = args["backtrack"]
                             if isinstance(args.get("other_params"), dict):
                                 params.update(args["other_params"])
-                            ind_resp = requests.get(f"{self.taapi.base_url}{args['indicator']}", params=params).json()
-                            messages.append({
-                                "role": "tool",
-                                "tool_call_id": tc.get("id"),
-                                "name": "fetch_taapi_indicator",
-                                "content": json.dumps(ind_resp),
-                            })
+                            content = json.dumps(self.taapi.get_indicator(args["indicator"], args["symbol"], args["interval"], params))
+                        except requests.HTTPError as ex:
+                            # Hand back TAAPI's error body; the exception text embeds the request URL (and secret)
+                            content = ex.response.text if ex.response is not None else "Error: TAAPI request failed"
+                        except requests.RequestException as ex:
+                            # Connection/timeout errors also embed the URL, so report only the error type
+                            content = f"Error: {type(ex).__name__}"
                         except Exception as ex:
-                            messages.append({
-                                "role": "tool",
-                                "tool_call_id": tc.get("id"),
-                                "name": "fetch_taapi_indicator",
-                                "content": f"Error: {str(ex)}",
-                            })
+                            content = f"Error: {str(ex)}"
+                        messages.append({
+                            "role": "tool",
+                            "tool_call_id": tc.get("id"),
+                            "name": "fetch_taapi_indicator",
+                            "content": content,
+                        })
                 continue
 
             try:
@@ -344,13 +358,13 @@ class TradingAgent:
                             })
                     return result
                 else:
-                    logging.error(f"Expected array, got: {type(parsed)}; attempting sanitize")
+                    logging.error("Expected array, got: %s; attempting sanitize", type(parsed))
                     sanitized = _sanitize_to_array(content if 'content' in locals() else json.dumps(parsed), assets)
                     if isinstance(sanitized, list) and sanitized:
                         return sanitized
                     return []
             except Exception as e:
-                logging.error(f"JSON parse error: {e}, content: {content[:200]}")
+                logging.error("JSON parse error: %s, content: %s", e, content[:200])
                 # Try sanitizer as last resort
                 sanitized = _sanitize_to_array(content, assets)
                 if isinstance(sanitized, list) and sanitized:
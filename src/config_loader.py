@@ -3,15 +3,23 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Snapshot the environment once (after .env is loaded) so lookups are plain dict probes
+_ENV_CACHE = dict(os.environ)
+
 def _get_env(name: str, default: str | None = None, required: bool = False) -> str | None:
-    value = os.getenv(name, default)
+    value = _ENV_CACHE.get(name, default)
     if required and (value is None or value == ""):
         raise RuntimeError(f"Missing required environment variable: {name}")
     return value
 
+def _first_env(*names: str, default: str | None = None) -> str | None:
+    """Return the first non-empty value among several env var names."""
+    return next((_ENV_CACHE[name] for name in names if _ENV_CACHE.get(name)), default)
+
 CONFIG = {
     "taapi_api_key": _get_env("TAAPI_API_KEY", required=True),
-    "hyperliquid_private_key": _get_env("HYPERLIQUID_PRIVATE_KEY") or _get_env("LIGHTER_PRIVATE_KEY"),
+    "taapi_max_concurrency": _get_env("TAAPI_MAX_CONCURRENCY", "4"),  # max in-flight TAAPI requests
+    "hyperliquid_private_key": _first_env("HYPERLIQUID_PRIVATE_KEY", "LIGHTER_PRIVATE_KEY"),
     "mnemonic": _get_env("MNEMONIC"),
     # Hyperliquid network/base URL overrides
     "hyperliquid_base_url": _get_env("HYPERLIQUID_BASE_URL"),
@@ -27,5 +35,5 @@ CONFIG = {
     "interval": _get_env("INTERVAL"),  # e.g., "5m", "1h"
     # API server
     "api_host": _get_env("API_HOST", "0.0.0.0"),
-    "api_port": _get_env("APP_PORT") or _get_env("API_PORT") or "3000",
+    "api_port": _first_env("APP_PORT", "API_PORT", default="3000"),
 }
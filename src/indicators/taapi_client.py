@@ -1,5 +1,6 @@
 import requests
 import os
+import threading
 import time
 import logging
 from src.config_loader import CONFIG
@@ -8,58 +9,51 @@ class TAAPIClient:
     def __init__(self):
         self.api_key = CONFIG["taapi_api_key"]
         self.base_url = "https://api.taapi.io/"
+        # Params shared by every request; per-call params are layered on top
+        self.base_params = {"secret": self.api_key, "exchange": "binance"}
+        # Callers may fetch from several threads; cap in-flight requests to respect TAAPI rate limits
+        max_concurrency = int(CONFIG.get("taapi_max_concurrency") or 4)
+        if max_concurrency < 1:
+            raise ValueError(f"TAAPI_MAX_CONCURRENCY must be >= 1, got {max_concurrency}")
+        self._request_slots = threading.BoundedSemaphore(max_concurrency)
+        # Keep-alive session so repeated calls reuse TLS connections; pool sized to the cap
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max_concurrency))
 
     def _get_with_retry(self, url, params, retries=3, backoff=0.5):
         """GET with exponential backoff retry."""
         for attempt in range(retries):
             try:
-                resp = requests.get(url, params=params, timeout=10)
+                with self._request_slots:
+                    resp = self.session.get(url, params=params, timeout=10)
                 resp.raise_for_status()
                 return resp.json()
             except requests.HTTPError as e:
-                if e.response.status_code >= 500 and attempt < retries - 1:
+                # 5xx and 429 (rate limit) are transient; back off and retry
+                if (e.response.status_code >= 500 or e.response.status_code == 429) and attempt < retries - 1:
                     wait = backoff * (2 ** attempt)
-                    logging.warning(f"TAAPI {e.response.status_code}, retrying in {wait}s")
+                    logging.warning("TAAPI %s, retrying in %ss", e.response.status_code, wait)
                     time.sleep(wait)
                 else:
                     raise
             except requests.Timeout as e:
                 if attempt < retries - 1:
                     wait = backoff * (2 ** attempt)
-                    logging.warning(f"TAAPI timeout, retrying in {wait}s")
+                    logging.warning("TAAPI timeout, retrying in %ss", wait)
                     time.sleep(wait)
                 else:
                     raise
         raise RuntimeError("Max retries exceeded")
 
-    def get_indicators(self, asset, interval):
-        params = {
-            "secret": self.api_key,
-            "exchange": "binance",
-            "symbol": f"{asset}/USDT",
-            "interval": interval
-        }
-        rsi_response = self._get_with_retry(f"{self.base_url}rsi", params)
-        macd_response = self._get_with_retry(f"{self.base_url}macd", params)
-        sma_response = self._get_with_retry(f"{self.base_url}sma", params)
-        ema_response = self._get_with_retry(f"{self.base_url}ema", params)
-        bbands_response = self._get_with_retry(f"{self.base_url}bbands", params)
-        return {
-            "rsi": rsi_response.get("value"),
-            "macd": macd_response,
-            "sma": sma_response.get("value"),
-            "ema": ema_response.get("value"),
-            "bbands": bbands_response
-        }
+    def get_indicator(self, indicator, symbol, interval, params=None):
+        """Return the raw TAAPI response for one indicator request."""
+        request_params = {**self.base_params, "symbol": symbol, "interval": interval}
+        if params:
+            request_params.update(params)
+        return self._get_with_retry(f"{self.base_url}{indicator}", request_params)
 
     def get_historical_indicator(self, indicator, symbol, interval, results=10, params=None):
-        base_params = {
-            "secret": self.api_key,
-            "exchange": "binance",
-            "symbol": symbol,
-            "interval": interval,
-            "results": results
-        }
+        base_params = {**self.base_params, "symbol": symbol, "interval": interval, "results": results}
         if params:
             base_params.update(params)
         response = self._get_with_retry(f"{self.base_url}{indicator}", base_params)
@@ -75,24 +69,17 @@ class TAAPIClient:
                     return [round(v, 4) if isinstance(v, (int, float)) else v for v in data[value_key]]
                 # Error response
                 if "error" in data:
-                    import logging
-                    logging.error(f"TAAPI error for {indicator} {symbol} {interval}: {data.get('error')}")
+                    logging.error("TAAPI error for %s %s %s: %s", indicator, symbol, interval, data.get('error'))
                     return []
             return []
         except Exception as e:
-            import logging
-            logging.error(f"TAAPI fetch_series exception for {indicator}: {e}")
+            logging.error("TAAPI fetch_series exception for %s: %s", indicator, e)
             return []
 
     def fetch_value(self, indicator: str, symbol: str, interval: str, params: dict | None = None, key: str = "value"):
         """Fetch single value (no results param). TAAPI returns {"value": number}."""
         try:
-            base_params = {
-                "secret": self.api_key,
-                "exchange": "binance",
-                "symbol": symbol,
-                "interval": interval
-            }
+            base_params = {**self.base_params, "symbol": symbol, "interval": interval}
             if params:
                 base_params.update(params)
             data = self._get_with_retry(f"{self.base_url}{indicator}", base_params)
@@ -5,34 +5,51 @@ sys.path.append(str(pathlib.Path(__file__).parent.parent))
 from src.agent.decision_maker import TradingAgent
 from src.indicators.taapi_client import TAAPIClient
 from src.trading.hyperliquid_api import HyperliquidAPI
+from src.config_loader import CONFIG
 import time
 import asyncio
 import logging
 from collections import deque
 from datetime import datetime, timezone
 import math  # For Sharpe
-from dotenv import load_dotenv
 import os
 import json
 from aiohttp import web
 from src.utils.formatting import format_number as fmt, format_size as fmt_sz
 
-load_dotenv()
-
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 def clear_terminal():
     os.system('cls' if os.name == 'nt' else 'clear')
 
+# Seconds per interval unit suffix (e.g. "5m", "1h", "1d")
+_INTERVAL_UNIT_SECONDS = {'m': 60, 'h': 3600, 'd': 86400}
+
 def get_interval_seconds(interval_str):
-    if interval_str.endswith('m'):
-        return int(interval_str[:-1]) * 60
-    elif interval_str.endswith('h'):
-        return int(interval_str[:-1]) * 3600
-    elif interval_str.endswith('d'):
-        return int(interval_str[:-1]) * 86400
-    else:
+    unit_seconds = _INTERVAL_UNIT_SECONDS.get(interval_str[-1:])
+    if unit_seconds is None:
         raise ValueError(f"Unsupported interval: {interval_str}")
+    return int(interval_str[:-1]) * unit_seconds
+
+def tail_text(path, max_chars):
+    """Return the last max_chars characters of a UTF-8 text file without reading all of it."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        # UTF-8 uses at most 4 bytes per character; a split leading character is dropped
+        f.seek(max(0, size - max_chars * 4))
+        data = f.read().decode("utf-8", errors="ignore")
+    # Binary reads skip universal-newline translation; apply it so output matches a text-mode read
+    data = data.replace("\r\n", "\n").replace("\r", "\n")
+    return data[-max_chars:]
+
+def _is_failed_outputs(outs):
+    if not outs:
+        return True
+    try:
+        return all(isinstance(o, dict) and (o.get('action') == 'hold') and ('parse error' in (o.get('rationale','').lower())) for o in outs)
+    except Exception:
+        return True
 
 def main():
     clear_terminal()
@@ -42,27 +59,30 @@ def main():
     args = parser.parse_args()
 
     # Allow assets/interval via .env (CONFIG) if CLI not provided
-    from src.config_loader import CONFIG
     assets_env = CONFIG.get("assets")
     interval_env = CONFIG.get("interval")
-    if (not args.assets or len(args.assets) == 0) and assets_env:
+    if not args.assets and assets_env:
         # Support space or comma separated
         if "," in assets_env:
             args.assets = [a.strip() for a in assets_env.split(",") if a.strip()]
         else:
             args.assets = [a.strip() for a in assets_env.split(" ") if a.strip()]
+    if args.assets:
+        # Symbols key several per-loop dicts; intern so lookups hit the identity fast path
+        args.assets = [sys.intern(a) for a in args.assets]
     if not args.interval and interval_env:
         args.interval = interval_env
 
     if not args.assets or not args.interval:
         parser.error("Please provide --assets and --interval, or set ASSETS and INTERVAL in .env")
+    interval_seconds = get_interval_seconds(args.interval)
 
     taapi = TAAPIClient()
     hyperliquid = HyperliquidAPI()
     agent = TradingAgent()
 
 
-    start_time = datetime.now(timezone.utc)
+    start_monotonic = time.monotonic()  # elapsed-time reference, immune to wall-clock jumps
     invocation_count = 0
     trade_log = []  # For Sharpe: list of returns
     active_trades = []  # {'asset','is_long','amount','entry_price','tp_oid','sl_oid','exit_plan'}
@@ -71,6 +91,7 @@ def main():
     initial_account_value = None
     # Perp mid-price history sampled each loop (authoritative, avoids spot/perp basis mismatch)
     price_history = {}
+    price_history_len = 10  # samples kept per asset; the prompt shows all of them
 
     print(f"Starting trading agent for assets: {args.assets} at interval: {args.interval}")
 
@@ -81,12 +102,14 @@ def main():
         nonlocal invocation_count, initial_account_value
         while True:
             invocation_count += 1
-            minutes_since_start = (datetime.now(timezone.utc) - start_time).total_seconds() / 60
+            minutes_since_start = (time.monotonic() - start_monotonic) / 60
 
             # number formatting helpers imported from src.utils.formatting
 
             # Global account state
-            state = await hyperliquid.get_user_state()
+            # User state and one mids snapshot in a single round trip; the mids price positions and every asset this tick
+            sampled_at = datetime.now(timezone.utc).isoformat()
+            state, mids = await hyperliquid.get_account_snapshot()
             sharpe = calculate_sharpe(trade_log)
 
             # Format account info like example
@@ -94,16 +117,16 @@ def main():
             if initial_account_value is None:
                 initial_account_value = account_value
             total_return = ((account_value - initial_account_value) / initial_account_value * 100.0) if initial_account_value else 0.0
-            account_info = f"Current Total Return (percent): {total_return:.2f}%\nAvailable Cash: {fmt(state['balance'], 2)}\nCurrent Account Value: {fmt(account_value, 2)}\nSharpe Ratio: {sharpe:.3f}\nCurrent live positions & performance:\n"
+            account_parts = [f"Current Total Return (percent): {total_return:.2f}%\nAvailable Cash: {fmt(state['balance'], 2)}\nCurrent Account Value: {fmt(account_value, 2)}\nSharpe Ratio: {sharpe:.3f}\nCurrent live positions & performance:\n"]
             for pos in state['positions']:
                 coin = pos.get('coin')
-                current_px = round(await hyperliquid.get_current_price(coin), 2) if coin else 0
+                current_px = round(float(mids.get(coin, 0.0)), 2) if coin else 0
                 liq_px = fmt(pos.get('liquidationPx') or pos.get('liqPx', 0), 2)
                 qty_disp = fmt_sz(pos.get('szi'))
                 entry_disp = fmt(pos.get('entryPx'), 2)
                 pnl_disp = fmt(pos.get('pnl', 0), 4)
-                account_info += f"{{'symbol': '{coin}', 'quantity': {qty_disp}, 'entry_price': {entry_disp}, 'current_price': {current_px}, 'liquidation_price': {liq_px}, 'unrealized_pnl': {pnl_disp}, 'leverage': {pos.get('leverage', 1)}, ...}}\n"
-            account_info += "\nActive Trades with Exit Plans:\n"
+                account_parts.append(f"{{'symbol': '{coin}', 'quantity': {qty_disp}, 'entry_price': {entry_disp}, 'current_price': {current_px}, 'liquidation_price': {liq_px}, 'unrealized_pnl': {pnl_disp}, 'leverage': {pos.get('leverage', 1)}, ...}}\n")
+            account_parts.append("\nActive Trades with Exit Plans:\n")
             for trade in active_trades:
                 opened_at_str = trade.get('opened_at')
                 minutes_open = 0.0
@@ -114,27 +137,26 @@ def main():
                         minutes_open = 0.0
                 amt_disp = fmt_sz(trade['amount'])
                 entry_trade_disp = fmt(trade['entry_price'], 2)
-                account_info += (
+                account_parts.append(
                     f"Asset: {trade['asset']}, Long: {trade['is_long']}, Amount: {amt_disp}, "
                     f"Entry: {entry_trade_disp}, Opened: {opened_at_str}, MinutesOpen: {minutes_open:.1f}, "
                     f"TP OID: {trade['tp_oid']}, SL OID: {trade['sl_oid']}, Exit Plan: {trade['exit_plan']}\n"
                 )
             
             # Include recent diary entries for context
-            account_info += "\nRecent Trading History (last 10 decisions):\n"
+            account_parts.append("\nRecent Trading History (last 10 decisions):\n")
             try:
                 with open(diary_path, "r") as f:
-                    lines = f.readlines()
-                    for line in lines[-10:]:
+                    for line in deque(f, maxlen=10):
                         entry = json.loads(line)
-                        account_info += f"{entry.get('timestamp', '')} - {entry.get('asset', '')}: {entry.get('action', '')} - {entry.get('rationale', '')[:80]}\n"
+                        account_parts.append(f"{entry.get('timestamp', '')} - {entry.get('asset', '')}: {entry.get('action', '')} - {entry.get('rationale', '')[:80]}\n")
             except Exception:
                 pass
 
             # Include active open orders context (TP/SL or any resting orders)
             try:
                 open_orders = await hyperliquid.get_open_orders()
-                account_info += "\nActive Open Orders:\n"
+                account_parts.append("\nActive Open Orders:\n")
                 for o in open_orders[:50]:  # cap to 50 for prompt size
                     coin = o.get('coin')
                     oid = o.get('oid')
@@ -149,9 +171,9 @@ def main():
                     else:
                         order_type = str(order_type_obj)
                     if trig_px is not None and px is None:
-                        account_info += f"oid:{oid} {coin} {'BUY' if side else 'SELL'} sz:{sz} triggerPx:{fmt(trig_px,2)} type:{order_type}\n"
+                        account_parts.append(f"oid:{oid} {coin} {'BUY' if side else 'SELL'} sz:{sz} triggerPx:{fmt(trig_px,2)} type:{order_type}\n")
                     else:
-                        account_info += f"oid:{oid} {coin} {'BUY' if side else 'SELL'} sz:{sz} px:{px} type:{order_type}\n"
+                        account_parts.append(f"oid:{oid} {coin} {'BUY' if side else 'SELL'} sz:{sz} px:{px} type:{order_type}\n")
             except Exception:
                 pass
 
@@ -184,7 +206,7 @@ def main():
             # Include recent fills to reflect executed TP/SL
             try:
                 fills = await hyperliquid.get_recent_fills(limit=50)
-                account_info += "\nRecent Fills (latest 20):\n"
+                account_parts.append("\nRecent Fills (latest 20):\n")
                 for f in fills[-20:]:
                     try:
                         coin = f.get('coin') or f.get('asset')
@@ -201,7 +223,7 @@ def main():
                                 t_iso = datetime.fromtimestamp(t_int, tz=timezone.utc).isoformat()
                         except Exception:
                             t_iso = str(t_raw)
-                        account_info += f"{t_iso} {coin} {'BUY' if is_buy else 'SELL'} sz:{sz} px:{px}\n"
+                        account_parts.append(f"{t_iso} {coin} {'BUY' if is_buy else 'SELL'} sz:{sz} px:{px}\n")
                     except Exception:
                         continue
             except Exception:
@@ -227,71 +249,20 @@ def main():
                             "opened_at": trade.get('opened_at')
                         }) + "\n")
 
-            # Gather data for ALL assets first
-            all_market_data = ""
+            # Gather data for ALL assets concurrently (TAAPI calls run off the event loop)
+            gathered = await asyncio.gather(*(gather_asset_data(asset, sampled_at, mids) for asset in args.assets), return_exceptions=True)
+            market_sections = []
             asset_prices = {}
-            for asset in args.assets:
-                try:
-                    # Gather data like example
-                    current_price = round(await hyperliquid.get_current_price(asset), 2)
-                    # Update perp mid-price history (sampled per loop)
-                    if asset not in price_history:
-                        price_history[asset] = deque(maxlen=60)
-                    price_history[asset].append({"t": datetime.now(timezone.utc).isoformat(), "mid": fmt(current_price, 2)})
-                    oi = await hyperliquid.get_open_interest(asset)
-                    funding = await hyperliquid.get_funding_rate(asset)
-
-                    # Initial indicators (intraday) from TAAPI only; avoid spot/perp basis mismatch
-                    indicators = taapi.get_indicators(asset, args.interval)
-                    hist_prices = []
-
-                    intraday_tf = "5m"
-                    ema_series = taapi.fetch_series("ema", f"{asset}/USDT", intraday_tf, results=10, params={"period": 20}, value_key="value")
-                    macd_series = taapi.fetch_series("macd", f"{asset}/USDT", intraday_tf, results=10, value_key="valueMACD")
-                    rsi7_series = taapi.fetch_series("rsi", f"{asset}/USDT", intraday_tf, results=10, params={"period": 7}, value_key="value")
-                    rsi14_series = taapi.fetch_series("rsi", f"{asset}/USDT", intraday_tf, results=10, params={"period": 14}, value_key="value")
-                    cur_rsi7 = round(rsi7_series[-1], 2) if rsi7_series else "N/A"
-                    cur_ema20 = round(ema_series[-1], 2) if ema_series else "N/A"
-                    cur_macd = round(macd_series[-1], 2) if macd_series else "N/A"
-                    ema_series_r = [fmt(v, 2) for v in ema_series] if ema_series else []
-                    macd_series_r = [fmt(v, 2) for v in macd_series] if macd_series else []
-                    rsi7_series_r = [fmt(v, 2) for v in rsi7_series] if rsi7_series else []
-                    rsi14_series_r = [fmt(v, 2) for v in rsi14_series] if rsi14_series else []
-
-                    # Long-term (4h)
-                    lt_ema20 = taapi.fetch_value("ema", f"{asset}/USDT", "4h", params={"period": 20}, key="value")
-                    lt_ema20 = round(lt_ema20, 2) if lt_ema20 is not None else "N/A"
-                    lt_ema50 = taapi.fetch_value("ema", f"{asset}/USDT", "4h", params={"period": 50}, key="value")
-                    lt_ema50 = round(lt_ema50, 2) if lt_ema50 is not None else "N/A"
-                    lt_atr3 = taapi.fetch_value("atr", f"{asset}/USDT", "4h", params={"period": 3}, key="value")
-                    lt_atr3 = round(lt_atr3, 2) if lt_atr3 is not None else "N/A"
-                    lt_atr14 = taapi.fetch_value("atr", f"{asset}/USDT", "4h", params={"period": 14}, key="value")
-                    lt_atr14 = round(lt_atr14, 2) if lt_atr14 is not None else "N/A"
-                    lt_macd_series = taapi.fetch_series("macd", f"{asset}/USDT", "4h", results=10, value_key="valueMACD")
-                    lt_rsi_series = taapi.fetch_series("rsi", f"{asset}/USDT", "4h", results=10, params={"period": 14}, value_key="value")
-                    lt_macd_series_r = [fmt(v, 2) for v in lt_macd_series] if lt_macd_series else []
-                    lt_rsi_series_r = [fmt(v, 2) for v in lt_rsi_series] if lt_rsi_series else []
-
-                    # Format like example
-                    # Compute annualized funding (paid hourly: × 24 × 365)
-                    funding_annualized = round(funding * 24 * 365 * 100, 2) if funding else None
-                    market_data = f"ALL {asset.upper()} DATA\ncurrent_price = {current_price}, current_ema20 = {cur_ema20}, current_macd = {cur_macd}, current_rsi (7 period) = {cur_rsi7}\n"
-                    market_data += f"Open Interest: {oi}\nFunding Rate: {funding} (Annualized: {funding_annualized}%)\n"
-                    # Perp mid prices sampled per interval (authoritative, concise)
-                    recent_mids = [p["mid"] for p in list(price_history.get(asset, []))[-10:]]
-                    market_data += f"Perp mid prices (sampled): {json.dumps(recent_mids)}\n"
-                    market_data += f"EMA indicators (20-period): {json.dumps(ema_series_r)}\n"
-                    market_data += f"MACD indicators: {json.dumps(macd_series_r)}\n"
-                    market_data += f"RSI indicators (7-Period): {json.dumps(rsi7_series_r)}\n"
-                    market_data += f"RSI indicators (14-Period): {json.dumps(rsi14_series_r)}\n"
-                    market_data += f"Longer-term context (4-hour timeframe):\n20-Period EMA: {lt_ema20} vs. 50-Period EMA: {lt_ema50}\n3-Period ATR: {lt_atr3} vs. {lt_atr14}\nMACD indicators: {json.dumps(lt_macd_series_r)}\nRSI indicators (14-Period): {json.dumps(lt_rsi_series_r)}\n\n"
-
-                    all_market_data += market_data
-                    asset_prices[asset] = current_price
-                except Exception as e:
-                    import traceback
-                    add_event(f"Data gather error {asset}: {e}")
+            for asset, result in zip(args.assets, gathered):
+                if isinstance(result, Exception):
+                    add_event(f"Data gather error {asset}: {result}")
                     continue
+                market_data, current_price = result
+                market_sections.append(market_data)
+                asset_prices[asset] = current_price
+
+            all_market_data = "".join(market_sections)
+            account_info = "".join(account_parts)
 
             # Single LLM call with all assets
             context = (
@@ -306,14 +277,6 @@ def main():
             with open("prompts.log", "a") as f:
                 f.write(f"\n\n--- {datetime.now()} - ALL ASSETS ---\n{context}\n")
 
-            def _is_failed_outputs(outs):
-                if not outs:
-                    return True
-                try:
-                    return all(isinstance(o, dict) and (o.get('action') == 'hold') and ('parse error' in (o.get('rationale','').lower())) for o in outs)
-                except Exception:
-                    return True
-
             try:
                 outputs = agent.decide_trade(args.assets, context)
                 if not isinstance(outputs, list):
@@ -350,7 +313,6 @@ def main():
                         continue
                     action = output.get("action")
                     current_price = asset_prices.get(asset, 0)
-                    action = output["action"]
                     if action in ("buy", "sell"):
                         is_buy = action == "buy"
                         alloc_usd = float(output.get("allocation_usd", 0.0))
@@ -360,30 +322,21 @@ def main():
                         amount = alloc_usd / current_price
 
                         order = await hyperliquid.place_buy_order(asset, amount) if is_buy else await hyperliquid.place_sell_order(asset, amount)
-                        # Confirm by checking recent fills for this asset shortly after placing
-                        await asyncio.sleep(1)
-                        fills_check = await hyperliquid.get_recent_fills(limit=10)
-                        filled = False
-                        for fc in reversed(fills_check):
-                            try:
-                                if (fc.get('coin') == asset or fc.get('asset') == asset):
-                                    filled = True
-                                    break
-                            except Exception:
-                                continue
+                        # Market orders are IOC, so the response already reports whether it filled
+                        filled = hyperliquid.is_filled(order)
                         trade_log.append({"type": action, "price": current_price, "amount": amount, "exit_plan": output["exit_plan"], "filled": filled})
                         tp_oid = None
                         sl_oid = None
-                        if output["tp_price"]:
-                            tp_order = await hyperliquid.place_take_profit(asset, is_buy, amount, output["tp_price"])
-                            tp_oids = hyperliquid.extract_oids(tp_order)
-                            tp_oid = tp_oids[0] if tp_oids else None
-                            add_event(f"TP placed {asset} at {output['tp_price']}")
-                        if output["sl_price"]:
-                            sl_order = await hyperliquid.place_stop_loss(asset, is_buy, amount, output["sl_price"])
-                            sl_oids = hyperliquid.extract_oids(sl_order)
-                            sl_oid = sl_oids[0] if sl_oids else None
-                            add_event(f"SL placed {asset} at {output['sl_price']}")
+                        if output["tp_price"] or output["sl_price"]:
+                            # TP and SL go out as one bulk action; statuses come back in [tp, sl] order
+                            tpsl_order = await hyperliquid.place_tp_sl(asset, is_buy, amount, output["tp_price"], output["sl_price"])
+                            status_oids = iter(hyperliquid.extract_status_oids(tpsl_order))
+                            if output["tp_price"]:
+                                tp_oid = next(status_oids, None)
+                                add_event(f"TP placed {asset} at {output['tp_price']}")
+                            if output["sl_price"]:
+                                sl_oid = next(status_oids, None)
+                                add_event(f"SL placed {asset} at {output['sl_price']}")
                         # Reconcile: if opposite-side position exists or TP/SL just filled, clear stale active_trades for this asset
                         for existing in active_trades[:]:
                             if existing.get('asset') == asset:
@@ -437,7 +390,7 @@ def main():
                     import traceback
                     add_event(f"Execution error {asset}: {e}")
 
-            await asyncio.sleep(get_interval_seconds(args.interval))
+            await asyncio.sleep(interval_seconds)
 
     async def handle_diary(request):
         try:
@@ -454,9 +407,8 @@ def main():
                 return web.Response(text=data, content_type="text/plain", headers=headers)
             limit = int(request.query.get('limit', '200'))
             with open(diary_path, "r") as f:
-                lines = f.readlines()
-            start = max(0, len(lines) - limit)
-            entries = [json.loads(l) for l in lines[start:]]
+                lines = deque(f, maxlen=max(limit, 0))
+            entries = [json.loads(l) for l in lines]
             return web.json_response({"entries": entries})
         except FileNotFoundError:
             return web.json_response({"entries": []})
@@ -470,14 +422,18 @@ def main():
             limit_param = request.query.get('limit')
             if not os.path.exists(path):
                 return web.Response(text="", content_type="text/plain")
-            with open(path, "r") as f:
-                data = f.read()
             if download or (limit_param and (limit_param.lower() == 'all' or limit_param == '-1')):
+                with open(path, "r") as f:
+                    data = f.read()
                 headers = {}
                 if download:
                     headers["Content-Disposition"] = f"attachment; filename={os.path.basename(path)}"
                 return web.Response(text=data, content_type="text/plain", headers=headers)
             limit = int(limit_param) if limit_param else 2000
+            if limit > 0:
+                return web.Response(text=tail_text(path, limit), content_type="text/plain")
+            with open(path, "r") as f:
+                data = f.read()
             return web.Response(text=data[-limit:], content_type="text/plain")
         except Exception as e:
             return web.json_response({"error": str(e)}, status=500)
@@ -489,10 +445,9 @@ def main():
     async def main_async():
         app = web.Application()
         await start_api(app)
-        from src.config_loader import CONFIG as CFG
         runner = web.AppRunner(app)
         await runner.setup()
-        site = web.TCPSite(runner, CFG.get("api_host"), int(CFG.get("api_port")))
+        site = web.TCPSite(runner, CONFIG.get("api_host"), int(CONFIG.get("api_port")))
         await site.start()
         await run_loop()
 
@@ -512,15 +467,96 @@ def main():
         std = math.sqrt(var) if var > 0 else 0
         return mean / std if std > 0 else 0
 
+    async def fetch_taapi_context(asset):
+        """TAAPI fetches for one asset (intraday 5m + 4h context), issued concurrently.
+
+        The client calls are blocking, so each runs in a worker thread; TAAPIClient caps
+        how many requests are in flight at once.
+        """
+        # Intraday indicators from TAAPI only; avoid spot/perp basis mismatch
+        intraday_tf = "5m"
+        symbol = f"{asset}/USDT"
+        requests_by_key = {
+            "ema_series": (taapi.fetch_series, ("ema", symbol, intraday_tf), {"results": 10, "params": {"period": 20}, "value_key": "value"}),
+            "macd_series": (taapi.fetch_series, ("macd", symbol, intraday_tf), {"results": 10, "value_key": "valueMACD"}),
+            "rsi7_series": (taapi.fetch_series, ("rsi", symbol, intraday_tf), {"results": 10, "params": {"period": 7}, "value_key": "value"}),
+            "rsi14_series": (taapi.fetch_series, ("rsi", symbol, intraday_tf), {"results": 10, "params": {"period": 14}, "value_key": "value"}),
+            # Long-term (4h)
+            "lt_ema20": (taapi.fetch_value, ("ema", symbol, "4h"), {"params": {"period": 20}, "key": "value"}),
+            "lt_ema50": (taapi.fetch_value, ("ema", symbol, "4h"), {"params": {"period": 50}, "key": "value"}),
+            "lt_atr3": (taapi.fetch_value, ("atr", symbol, "4h"), {"params": {"period": 3}, "key": "value"}),
+            "lt_atr14": (taapi.fetch_value, ("atr", symbol, "4h"), {"params": {"period": 14}, "key": "value"}),
+            "lt_macd_series": (taapi.fetch_series, ("macd", symbol, "4h"), {"results": 10, "value_key": "valueMACD"}),
+            "lt_rsi_series": (taapi.fetch_series, ("rsi", symbol, "4h"), {"results": 10, "params": {"period": 14}, "value_key": "value"}),
+        }
+        values = await asyncio.gather(*(asyncio.to_thread(fn, *fn_args, **fn_kwargs) for fn, fn_args, fn_kwargs in requests_by_key.values()))
+        return dict(zip(requests_by_key.keys(), values))
+
+    async def gather_asset_data(asset, sampled_at, mids):
+        """Build the market-data prompt section for one asset. Returns (market_data, current_price).
+
+        ``sampled_at`` is the ISO timestamp recorded with the mid-price sample and ``mids``
+        the all-mids snapshot shared by every asset in the gather cycle.
+        """
+        # Gather data like example
+        mid = mids.get(asset)
+        if mid is None:
+            raise ValueError(f"no mid price for {asset}")
+        current_price = round(float(mid), 2)
+        # Update perp mid-price history (sampled per loop)
+        if asset not in price_history:
+            price_history[asset] = deque(maxlen=price_history_len)
+        price_history[asset].append({"t": sampled_at, "mid": fmt(current_price, 2)})
+        oi = await hyperliquid.get_open_interest(asset)
+        funding = await hyperliquid.get_funding_rate(asset)
+
+        ctx = await fetch_taapi_context(asset)
+        ema_series = ctx["ema_series"]
+        macd_series = ctx["macd_series"]
+        rsi7_series = ctx["rsi7_series"]
+        rsi14_series = ctx["rsi14_series"]
+        cur_rsi7 = round(rsi7_series[-1], 2) if rsi7_series else "N/A"
+        cur_ema20 = round(ema_series[-1], 2) if ema_series else "N/A"
+        cur_macd = round(macd_series[-1], 2) if macd_series else "N/A"
+        ema_series_r = [fmt(v, 2) for v in ema_series] if ema_series else []
+        macd_series_r = [fmt(v, 2) for v in macd_series] if macd_series else []
+        rsi7_series_r = [fmt(v, 2) for v in rsi7_series] if rsi7_series else []
+        rsi14_series_r = [fmt(v, 2) for v in rsi14_series] if rsi14_series else []
+
+        lt_ema20 = round(ctx["lt_ema20"], 2) if ctx["lt_ema20"] is not None else "N/A"
+        lt_ema50 = round(ctx["lt_ema50"], 2) if ctx["lt_ema50"] is not None else "N/A"
+        lt_atr3 = round(ctx["lt_atr3"], 2) if ctx["lt_atr3"] is not None else "N/A"
+        lt_atr14 = round(ctx["lt_atr14"], 2) if ctx["lt_atr14"] is not None else "N/A"
+        lt_macd_series = ctx["lt_macd_series"]
+        lt_rsi_series = ctx["lt_rsi_series"]
+        lt_macd_series_r = [fmt(v, 2) for v in lt_macd_series] if lt_macd_series else []
+        lt_rsi_series_r = [fmt(v, 2) for v in lt_rsi_series] if lt_rsi_series else []
+
+        # Format like example
+        # Compute annualized funding (paid hourly: × 24 × 365)
+        funding_annualized = round(funding * 24 * 365 * 100, 2) if funding else None
+        market_parts = [f"ALL {asset.upper()} DATA\ncurrent_price = {current_price}, current_ema20 = {cur_ema20}, current_macd = {cur_macd}, current_rsi (7 period) = {cur_rsi7}\n"]
+        market_parts.append(f"Open Interest: {oi}\nFunding Rate: {funding} (Annualized: {funding_annualized}%)\n")
+        # Perp mid prices sampled per interval (authoritative, concise)
+        recent_mids = [p["mid"] for p in price_history[asset]]
+        market_parts.append(f"Perp mid prices (sampled): {json.dumps(recent_mids)}\n")
+        market_parts.append(f"EMA indicators (20-period): {json.dumps(ema_series_r)}\n")
+        market_parts.append(f"MACD indicators: {json.dumps(macd_series_r)}\n")
+        market_parts.append(f"RSI indicators (7-Period): {json.dumps(rsi7_series_r)}\n")
+        market_parts.append(f"RSI indicators (14-Period): {json.dumps(rsi14_series_r)}\n")
+        market_parts.append(f"Longer-term context (4-hour timeframe):\n20-Period EMA: {lt_ema20} vs. 50-Period EMA: {lt_ema50}\n3-Period ATR: {lt_atr3} vs. {lt_atr14}\nMACD indicators: {json.dumps(lt_macd_series_r)}\nRSI indicators (14-Period): {json.dumps(lt_rsi_series_r)}\n\n")
+        return "".join(market_parts), current_price
+
     async def check_exit_condition(trade, taapi, hyperliquid):
         plan = (trade.get("exit_plan") or "").lower()
         if not plan:
             return False
         try:
             if "macd" in plan and "below" in plan:
-                macd = taapi.get_indicators(trade["asset"], "4h")["macd"]["valueMACD"]
+                # Parse first so an unparseable plan costs no TAAPI request; fetch only MACD
                 threshold = float(plan.split("below")[-1].strip())
-                return macd < threshold
+                macd = taapi.fetch_value("macd", f"{trade['asset']}/USDT", "4h", key="valueMACD")
+                return macd is not None and macd < threshold
             if "close above ema50" in plan:
                 ema50 = taapi.get_historical_indicator("ema", f"{trade['asset']}/USDT", "4h", results=1, params={"period": 50})[0]["value"]
                 current = await hyperliquid.get_current_price(trade["asset"])
@@ -2,6 +2,7 @@ import asyncio
 import logging
 import aiohttp
 from src.config_loader import CONFIG
+from hyperliquid.api import API
 from hyperliquid.exchange import Exchange
 from hyperliquid.info import Info
 from hyperliquid.utils import constants  # For MAINNET/TESTNET
@@ -12,6 +13,9 @@ import time
 import logging
 
 class HyperliquidAPI:
+    # Max age (seconds) of websocket-pushed mids before get_all_mids falls back to REST
+    MIDS_MAX_AGE = 10.0
+
     def __init__(self):
         if "hyperliquid_private_key" in CONFIG and CONFIG["hyperliquid_private_key"]:
             self.wallet = Account.from_key(CONFIG["hyperliquid_private_key"])
@@ -28,18 +32,46 @@ class HyperliquidAPI:
             else:
                 base_url = constants.MAINNET_API_URL
         self.base_url = base_url
+        self._ws_mids = None
+        self._ws_mids_at = 0.0
+        self._last_mids = {}  # last successful mids snapshot (REST or websocket)
+        self._sdk_meta = None  # (meta, spot_meta) reused across client rebuilds
+        self._meta_cache = None
+        self._meta_lock = asyncio.Lock()  # concurrent per-asset gathers share one metaAndAssetCtxs fetch
         self._build_clients()
 
     def _build_clients(self):
-        self.info = Info(self.base_url)
-        self.exchange = Exchange(self.wallet, self.base_url)
+        # Asset metadata is fetched once and handed to every rebuilt client; otherwise Info and
+        # Exchange's internal Info each refetch meta + spotMeta on construction
+        if self._sdk_meta is None:
+            api = API(self.base_url)
+            self._sdk_meta = (api.post("/info", {"type": "meta", "dex": ""}), api.post("/info", {"type": "spotMeta"}))
+        meta, spot_meta = self._sdk_meta
+        self.info = Info(self.base_url, meta=meta, spot_meta=spot_meta)
+        self.exchange = Exchange(self.wallet, self.base_url, meta=meta, spot_meta=spot_meta)
+        try:
+            self.info.subscribe({"type": "allMids"}, self._on_all_mids)
+        except Exception as e:
+            logging.warning("allMids subscription failed, using REST mids: %s", e)
+
+    def _on_all_mids(self, msg):
+        # Runs on the SDK websocket thread; swapping in the new dict is atomic
+        mids = (msg.get("data") or {}).get("mids")
+        if mids:
+            self._ws_mids = mids
+            self._ws_mids_at = time.monotonic()
 
     def _reset_clients(self):
+        # Close the old websocket first so only one allMids feed writes _ws_mids
+        try:
+            self.info.disconnect_websocket()
+        except Exception as e:
+            logging.debug("Hyperliquid websocket disconnect failed: %s", e)
         try:
             self._build_clients()
             logging.warning("Hyperliquid clients re-instantiated after connection issue")
         except Exception as e:
-            logging.error(f"Failed to reset Hyperliquid clients: {e}")
+            logging.error("Failed to reset Hyperliquid clients: %s", e)
 
     async def _retry(self, fn, *args, max_attempts: int = 3, backoff_base: float = 0.5, reset_on_fail: bool = True, to_thread: bool = True, **kwargs):
         last_err = None
@@ -50,7 +82,7 @@ class HyperliquidAPI:
                 return await fn(*args, **kwargs)
             except (WebSocketConnectionClosedException, aiohttp.ClientError, ConnectionError, TimeoutError, socket.timeout) as e:
                 last_err = e
-                logging.warning(f"HL call failed (attempt {attempt + 1}/{max_attempts}): {e}")
+                logging.warning("HL call failed (attempt %d/%d): %s", attempt + 1, max_attempts, e)
                 if reset_on_fail:
                     self._reset_clients()
                 await asyncio.sleep(backoff_base * (2 ** attempt))
@@ -58,7 +90,7 @@ class HyperliquidAPI:
             except Exception as e:
                 # Unknown errors: don't spin forever, but allow a quick reset once
                 last_err = e
-                logging.warning(f"HL call unexpected error (attempt {attempt + 1}/{max_attempts}): {e}")
+                logging.warning("HL call unexpected error (attempt %d/%d): %s", attempt + 1, max_attempts, e)
                 if reset_on_fail and attempt == 0:
                     self._reset_clients()
                     await asyncio.sleep(backoff_base)
@@ -68,14 +100,14 @@ class HyperliquidAPI:
 
     def round_size(self, asset, amount):
         """Round amount to asset's szDecimals precision to avoid float_to_wire errors."""
-        meta = self._meta_cache[0] if hasattr(self, '_meta_cache') and self._meta_cache else None
-        if meta:
-            universe = meta.get("universe", [])
-            asset_info = next((u for u in universe if u.get("name") == asset), None)
-            if asset_info:
-                decimals = asset_info.get("szDecimals", 8)
-                return round(amount, decimals)
-        return round(amount, 8)
+        decimals = getattr(self, '_sz_decimals', {}).get(asset, 8)
+        return round(amount, decimals)
+
+    def round_price(self, asset, px):
+        """Round px to Hyperliquid's tick rules (5 significant figures, at most 6 - szDecimals decimals)."""
+        px = float(f"{float(px):.5g}")
+        decimals = getattr(self, '_sz_decimals', {}).get(asset)
+        return round(px, 6 - decimals) if decimals is not None else px
 
     async def place_buy_order(self, asset, amount, slippage=0.01):
         amount = self.round_size(asset, amount)
@@ -85,52 +117,65 @@ class HyperliquidAPI:
         amount = self.round_size(asset, amount)
         return await self._retry(lambda: self.exchange.market_open(asset, False, amount, None, slippage))
 
-    async def place_take_profit(self, asset, is_buy, amount, tp_price):
-        # TP as trigger order (market close at tp_price, reduce-only)
-        amount = self.round_size(asset, amount)
-        order_type = {"trigger": {"triggerPx": tp_price, "isMarket": True, "tpsl": "tp"}}
-        return await self._retry(lambda: self.exchange.order(asset, not is_buy, amount, tp_price, order_type, True))
+    def _trigger_order(self, asset, is_buy, amount, trigger_px, tpsl):
+        # Trigger order closing the position (market close at trigger_px, reduce-only)
+        trigger_px = self.round_price(asset, trigger_px)
+        return {
+            "coin": asset,
+            "is_buy": not is_buy,
+            "sz": amount,
+            "limit_px": trigger_px,
+            "order_type": {"trigger": {"triggerPx": trigger_px, "isMarket": True, "tpsl": tpsl}},
+            "reduce_only": True,
+        }
+
+    async def place_tp_sl(self, asset, is_buy, amount, tp_price=None, sl_price=None):
+        """Place TP and/or SL trigger orders in one bulk action.
 
-    async def place_stop_loss(self, asset, is_buy, amount, sl_price):
-        # SL as trigger order (market close at sl_price, reduce-only)
+        Statuses in the response follow request order: TP first (if given), then SL.
+        """
         amount = self.round_size(asset, amount)
-        order_type = {"trigger": {"triggerPx": sl_price, "isMarket": True, "tpsl": "sl"}}
-        return await self._retry(lambda: self.exchange.order(asset, not is_buy, amount, sl_price, order_type, True))
+        orders = []
+        if tp_price:
+            orders.append(self._trigger_order(asset, is_buy, amount, tp_price, "tp"))
+        if sl_price:
+            orders.append(self._trigger_order(asset, is_buy, amount, sl_price, "sl"))
+        return await self._retry(lambda: self.exchange.bulk_orders(orders))
 
     async def cancel_order(self, asset, oid):
         return await self._retry(lambda: self.exchange.cancel(asset, oid))
 
     async def cancel_all_orders(self, asset):
-        """Cancel all open orders for an asset."""
+        """Cancel all open orders for an asset in a single bulk cancel action."""
         try:
             open_orders = await self._retry(lambda: self.info.frontend_open_orders(self.wallet.address))
+            cancelled_count = 0
+            cancel_requests = []
             for order in open_orders:
                 if order.get("coin") == asset:
+                    cancelled_count += 1
                     oid = order.get("oid")
                     if oid:
-                        await self.cancel_order(asset, oid)
-            return {"status": "ok", "cancelled_count": len([o for o in open_orders if o.get("coin") == asset])}
+                        cancel_requests.append({"coin": asset, "oid": oid})
+            if cancel_requests:
+                await self._retry(lambda: self.exchange.bulk_cancel(cancel_requests))
+            return {"status": "ok", "cancelled_count": cancelled_count}
         except Exception as e:
-            logging.error(f"Cancel all orders error for {asset}: {e}")
+            logging.error("Cancel all orders error for %s: %s", asset, e)
             return {"status": "error", "message": str(e)}
 
     async def get_open_orders(self):
         """Return list of current open orders for this wallet."""
         try:
             orders = await self._retry(lambda: self.info.frontend_open_orders(self.wallet.address))
-            # Normalize trigger price if present in orderType
+            # frontendOpenOrders rows carry triggerPx as a top-level float string; normalize to float
             for o in orders:
-                try:
-                    ot = o.get("orderType")
-                    if isinstance(ot, dict) and "trigger" in ot:
-                        trig = ot.get("trigger") or {}
-                        if "triggerPx" in trig:
-                            o["triggerPx"] = float(trig["triggerPx"])
-                except Exception:
-                    continue
+                trig_px = o.get("triggerPx")
+                if trig_px:
+                    o["triggerPx"] = float(trig_px)
             return orders
         except Exception as e:
-            logging.error(f"Get open orders error: {e}")
+            logging.error("Get open orders error: %s", e)
             return []
 
     async def get_recent_fills(self, limit: int = 50):
@@ -147,73 +192,118 @@ class HyperliquidAPI:
                 return fills[-limit:]
             return []
         except Exception as e:
-            logging.error(f"Get recent fills error: {e}")
+            logging.error("Get recent fills error: %s", e)
             return []
 
-    def extract_oids(self, order_result):
+    def extract_status_oids(self, order_result):
+        """Return one oid per order status in request order (None where an order errored)."""
         oids = []
         try:
-            statuses = order_result["response"]["data"]["statuses"]
-            for st in statuses:
-                if "resting" in st and "oid" in st["resting"]:
-                    oids.append(st["resting"]["oid"])
-                if "filled" in st and "oid" in st["filled"]:
-                    oids.append(st["filled"]["oid"])
+            for st in order_result["response"]["data"]["statuses"]:
+                info = (st.get("resting") or st.get("filled") or {}) if isinstance(st, dict) else {}
+                oids.append(info.get("oid"))
         except Exception:
             pass
         return oids
 
-    async def get_user_state(self):
-        state = await self._retry(lambda: self.info.user_state(self.wallet.address))
+    def is_filled(self, order_result):
+        """True if any status in an order response reports a fill (IOC/market orders settle synchronously)."""
+        try:
+            statuses = order_result["response"]["data"]["statuses"]
+            return any(isinstance(st, dict) and "filled" in st for st in statuses)
+        except Exception:
+            return False
+
+    def _summarize_state(self, state, mids):
+        """Attach pnl (priced from one mids snapshot) to each position and return balance/positions."""
         positions = state.get("assetPositions", [])
         for pos_wrap in positions:
             pos = pos_wrap["position"]
             entry_px = float(pos.get("entryPx", 0) or 0)
             size = float(pos.get("szi", 0) or 0)
             side = "long" if size > 0 else "short"
-            current_px = await self.get_current_price(pos["coin"]) if entry_px and size else 0.0
+            mid = mids.get(pos["coin"])
+            if mid is None:
+                # No mid available (e.g. mids fetch failed); use the exchange's own unrealized pnl
+                pos["pnl"] = float(pos.get("unrealizedPnl", 0) or 0)
+                continue
+            current_px = float(mid) if entry_px and size else 0.0
             pnl = (current_px - entry_px) * abs(size) if side == "long" else (entry_px - current_px) * abs(size)
             pos["pnl"] = pnl
         balance = float(state.get("withdrawable", 0.0))
         return {"balance": balance, "positions": [p["position"] for p in positions]}
 
+    async def get_user_state(self):
+        return (await self.get_account_snapshot())[0]
+
+    async def get_account_snapshot(self):
+        """Fetch user state and all mids concurrently; returns (state, mids) for one decision tick.
+
+        A mids failure falls back to the last known snapshot rather than failing the tick.
+        """
+        # Only the user-state call may reset clients, so one failing tick rebuilds them once
+        state, mids = await asyncio.gather(
+            self._retry(lambda: self.info.user_state(self.wallet.address)),
+            self.get_all_mids(reset_on_fail=False),
+            return_exceptions=True,
+        )
+        if isinstance(state, BaseException):
+            raise state
+        if isinstance(mids, BaseException):
+            logging.warning("All mids fetch failed, using last known mids: %s", mids)
+            mids = self._last_mids
+        return self._summarize_state(state, mids), mids
+
+    async def get_all_mids(self, reset_on_fail: bool = True):
+        """Return {coin: mid} for every perp; served from the allMids websocket feed while fresh, else one REST request."""
+        if self._ws_mids is not None and time.monotonic() - self._ws_mids_at < self.MIDS_MAX_AGE:
+            mids = self._ws_mids
+        else:
+            mids = await self._retry(lambda: self.info.all_mids(), reset_on_fail=reset_on_fail)
+        self._last_mids = mids
+        return mids
+
     async def get_current_price(self, asset):
-        mids = await self._retry(lambda: self.info.all_mids())
+        mids = await self.get_all_mids()
         return float(mids.get(asset, 0.0))
 
     async def get_meta_and_ctxs(self):
         """Cache meta and asset contexts to avoid repeated calls."""
-        if not hasattr(self, '_meta_cache') or not self._meta_cache:
-            response = await self._retry(lambda: self.info.meta_and_asset_ctxs())
-            self._meta_cache = response
+        if not self._meta_cache:
+            async with self._meta_lock:
+                if not self._meta_cache:
+                    response = await self._retry(lambda: self.info.meta_and_asset_ctxs())
+                    # Per-asset lookups built once so sizing and ctx reads are dict probes, not universe scans
+                    universe = response[0].get("universe", []) if isinstance(response, list) and response else []
+                    self._asset_index = {u.get("name"): i for i, u in enumerate(universe)}
+                    self._sz_decimals = {u.get("name"): u.get("szDecimals", 8) for u in universe}
+                    self._meta_cache = response
         return self._meta_cache
 
+    async def _asset_ctx(self, asset):
+        """Return the cached asset context dict for asset, or None if unknown."""
+        data = await self.get_meta_and_ctxs()
+        if isinstance(data, list) and len(data) >= 2:
+            asset_ctxs = data[1]
+            asset_idx = self._asset_index.get(asset)
+            if asset_idx is not None and asset_idx < len(asset_ctxs):
+                return asset_ctxs[asset_idx]
+        return None
+
     async def get_open_interest(self, asset):
         try:
-            data = await self.get_meta_and_ctxs()
-            if isinstance(data, list) and len(data) >= 2:
-                meta, asset_ctxs = data[0], data[1]
-                universe = meta.get("universe", [])
-                asset_idx = next((i for i, u in enumerate(universe) if u.get("name") == asset), None)
-                if asset_idx is not None and asset_idx < len(asset_ctxs):
-                    oi = asset_ctxs[asset_idx].get("openInterest")
-                    return round(float(oi), 2) if oi else None
-            return None
+            ctx = await self._asset_ctx(asset)
+            oi = ctx.get("openInterest") if ctx else None
+            return round(float(oi), 2) if oi else None
         except Exception as e:
-            logging.error(f"OI fetch error for {asset}: {e}")
+            logging.error("OI fetch error for %s: %s", asset, e)
             return None
 
     async def get_funding_rate(self, asset):
         try:
-            data = await self.get_meta_and_ctxs()
-            if isinstance(data, list) and len(data) >= 2:
-                meta, asset_ctxs = data[0], data[1]
-                universe = meta.get("universe", [])
-                asset_idx = next((i for i, u in enumerate(universe) if u.get("name") == asset), None)
-                if asset_idx is not None and asset_idx < len(asset_ctxs):
-                    funding = asset_ctxs[asset_idx].get("funding")
-                    return round(float(funding), 8) if funding else None
-            return None
+            ctx = await self._asset_ctx(asset)
+            funding = ctx.get("funding") if ctx else None
+            return round(float(funding), 8) if funding else None
         except Exception as e:
-            logging.error(f"Funding fetch error for {asset}: {e}")
+            logging.error("Funding fetch error for %s: %s", asset, e)
             return None